@@ -1,11 +1,25 @@
 import fitz  # PyMuPDF
 from pathlib import Path
 import csv
+import os
+from multiprocessing import Pool
 
 PDF_DIR = Path("downloads_dataset1")
 OUT_CSV = Path("analysis_200.csv")
+FIELDNAMES = ["file", "pages", "images", "text_chars", "size_kb"]
 
-def analyze_pdf(path: Path) -> dict:
+def list_pdfs(pdf_dir: Path) -> list:
+    # scandir: la dimensione arriva da DirEntry.stat(), senza un stat() per file nel loop
+    with os.scandir(pdf_dir) as it:
+        entries = [
+            (Path(e.path), e.stat().st_size)
+            for e in it
+            if e.name.startswith("EFTA") and e.name.endswith(".pdf") and e.is_file()
+        ]
+    entries.sort()
+    return entries
+
+def analyze_pdf(path: Path, size: int) -> dict:
     doc = fitz.open(path)
     pages = len(doc)
 
@@ -27,31 +41,39 @@ def analyze_pdf(path: Path) -> dict:
         "pages": pages,
         "images": total_images,
         "text_chars": total_text_chars,
-        "size_kb": round(path.stat().st_size / 1024, 1),
+        "size_kb": round(size / 1024, 1),
     }
 
+def analyze_entry(entry: tuple) -> dict:
+    return analyze_pdf(*entry)
+
 def main():
     if not PDF_DIR.exists():
         raise SystemExit(f"Directory non trovata: {PDF_DIR.resolve()}")
 
-    pdfs = sorted(PDF_DIR.glob("EFTA*.pdf"))
+    pdfs = list_pdfs(PDF_DIR)
     if not pdfs:
         raise SystemExit(f"Nessun PDF trovato in: {PDF_DIR.resolve()}")
 
-    rows = [analyze_pdf(p) for p in pdfs]
+    total = only_images = has_text = no_images = 0
 
-    with open(OUT_CSV, "w", newline="", encoding="utf-8") as f:
-        w = csv.DictWriter(f, fieldnames=rows[0].keys())
+    # CSV scritto riga per riga man mano che i worker finiscono
+    with open(OUT_CSV, "w", newline="", encoding="utf-8") as f, Pool() as pool:
+        w = csv.DictWriter(f, fieldnames=FIELDNAMES)
         w.writeheader()
-        w.writerows(rows)
+        # un PDF per task: file indipendenti, CPU-bound -> un processo per core
+        for r in pool.imap(analyze_entry, pdfs, chunksize=8):
+            w.writerow(r)
+            f.flush()
 
-    # mini-sommario
-    only_images = sum(1 for r in rows if r["images"] > 0 and r["text_chars"] == 0)
-    has_text = sum(1 for r in rows if r["text_chars"] > 0)
-    no_images = sum(1 for r in rows if r["images"] == 0)
+            # mini-sommario
+            total += 1
+            only_images += r["images"] > 0 and r["text_chars"] == 0
+            has_text += r["text_chars"] > 0
+            no_images += r["images"] == 0
 
     print("Saved:", OUT_CSV.resolve())
-    print(f"Totale file analizzati: {len(rows)}")
+    print(f"Totale file analizzati: {total}")
     print(f"PDF con immagini e zero testo: {only_images}")
     print(f"PDF con testo (text_chars>0): {has_text}")
     print(f"PDF senza immagini (images=0): {no_images}")
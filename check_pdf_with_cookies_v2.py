@@ -1,11 +1,19 @@
-import json
+from functools import lru_cache
+
 import httpx
+import orjson
 
 PDF_URL = "https://www.justice.gov/epstein/files/DataSet%201/EFTA00000001.pdf"
 
-def load_cookies_from_storage(path: str):
-    data = json.load(open(path, "r", encoding="utf-8"))
-    return {c["name"]: c["value"] for c in data.get("cookies", [])}
+@lru_cache(maxsize=4)
+def load_cookies_from_storage(path: str) -> httpx.Cookies:
+    # parse una sola volta per path; httpx copia il jar in ogni client
+    with open(path, "rb") as f:
+        data = orjson.loads(f.read())
+    cookies = httpx.Cookies()
+    for c in data.get("cookies", []):
+        cookies.set(c["name"], c["value"])
+    return cookies
 
 cookies = load_cookies_from_storage("justice_storage.json")
 
@@ -15,7 +23,7 @@ headers = {
     "Range": "bytes=0-1",
 }
 
-with httpx.Client(headers=headers, cookies=cookies, follow_redirects=False, timeout=30.0) as client:
+with httpx.Client(http2=True, headers=headers, cookies=cookies, follow_redirects=False, timeout=30.0) as client:
     r = client.get(PDF_URL)
     print("Status:", r.status_code)
     print("Location:", r.headers.get("location"))
@@ -1,28 +1,106 @@
 import os
-import json
 import csv
 import asyncio
+import random
+from email.utils import parsedate_to_datetime
+from datetime import datetime, timezone
 from pathlib import Path
 from typing import Dict, Optional
 
 import httpx
+import orjson
 
 BASE = "https://www.justice.gov/epstein/files/DataSet%201"
 OUTDIR = Path("downloads_dataset1")
 OUTDIR.mkdir(exist_ok=True)
+LOG_CSV = "download_log.csv"
+CHUNK_SIZE = 1 << 16
+
+# throttling lato server: si riprova con backoff invece di perdere l'id
+RETRY_STATUS = (429, 502, 503)
+MAX_ATTEMPTS = 5
+MAX_BACKOFF = 60.0
 
 def efta_url(n: int) -> str:
     return f"{BASE}/EFTA{n:08d}.pdf"
 
 def load_cookies_from_storage(path: str) -> Dict[str, str]:
-    data = json.load(open(path, "r", encoding="utf-8"))
+    data = orjson.loads(Path(path).read_bytes())
     return {c["name"]: c["value"] for c in data.get("cookies", [])}
 
+# distanzia gli avvii delle richieste di almeno 1/rate secondi (rate <= 0: nessun limite)
+class RateLimiter:
+    def __init__(self, rate: float):
+        self.interval = 1.0 / rate if rate > 0 else 0.0
+        self._lock = asyncio.Lock()
+        self._next = 0.0
+
+    async def wait(self) -> None:
+        async with self._lock:
+            loop = asyncio.get_running_loop()
+            now = loop.time()
+            if self._next > now:
+                await asyncio.sleep(self._next - now)
+                now = self._next
+            self._next = now + self.interval
+
 def is_pdf(r: httpx.Response) -> bool:
     ct = (r.headers.get("content-type") or "").lower()
     return "application/pdf" in ct or "pdf" in ct
 
-async def fetch_one(client: httpx.AsyncClient, n: int) -> Dict[str, str]:
+# risposta già aperta (non da ritentare): classifica e, se è un PDF, salva su disco
+async def save_response(r: httpx.Response, n: int, fname: str, target: Path) -> Dict[str, str]:
+    if r.status_code in (301, 302, 303, 307, 308):
+        # con cookie giusti non dovrebbe succedere; logghiamo
+        return {"id": str(n), "file": fname, "status": "REDIRECT", "http": str(r.status_code)}
+
+    if r.status_code == 404:
+        return {"id": str(n), "file": fname, "status": "NOT_FOUND", "http": "404"}
+
+    if r.status_code in RETRY_STATUS:
+        # tentativi esauriti: l'id va ripreso in un secondo giro
+        return {"id": str(n), "file": fname, "status": "THROTTLED", "http": str(r.status_code)}
+
+    if r.status_code != 200 or not is_pdf(r):
+        return {"id": str(n), "file": fname, "status": "NOT_PDF", "http": str(r.status_code)}
+
+    tmp = target.with_suffix(".pdf.part")
+    valid = False
+    try:
+        with tmp.open("wb") as f:
+            async for chunk in r.aiter_bytes(CHUNK_SIZE):
+                # il primo chunk deve avere la firma PDF, altrimenti si scarta
+                if not valid:
+                    if not chunk.startswith(b"%PDF"):
+                        break
+                    valid = True
+                f.write(chunk)
+    except BaseException:
+        tmp.unlink(missing_ok=True)
+        raise
+    if not valid:
+        tmp.unlink(missing_ok=True)
+        return {"id": str(n), "file": fname, "status": "NOT_PDF", "http": "200"}
+    tmp.replace(target)
+    return {"id": str(n), "file": fname, "status": "DOWNLOADED", "http": "200"}
+
+def retry_delay(r: httpx.Response, attempt: int) -> float:
+    # Retry-After se presente (secondi o data HTTP), altrimenti esponenziale con jitter
+    ra = (r.headers.get("retry-after") or "").strip()
+    if ra.isascii() and ra.isdigit():
+        # delta-seconds (RFC 9110): solo intero non negativo, niente "nan"/"inf"
+        return min(int(ra), MAX_BACKOFF)
+    if ra:
+        try:
+            wait = (parsedate_to_datetime(ra) - datetime.now(timezone.utc)).total_seconds()
+            return min(max(wait, 0.0), MAX_BACKOFF)
+        except (TypeError, ValueError):
+            pass
+    return min(2.0 ** attempt, MAX_BACKOFF) * random.uniform(0.5, 1.0)
+
+async def fetch_one(
+    client: httpx.AsyncClient, n: int, limiter: Optional[RateLimiter] = None
+) -> Dict[str, str]:
     url = efta_url(n)
     fname = f"EFTA{n:08d}.pdf"
     target = OUTDIR / fname
@@ -31,25 +109,16 @@ async def fetch_one(client: httpx.AsyncClient, n: int) -> Dict[str, str]:
         return {"id": str(n), "file": fname, "status": "SKIP_EXISTS", "http": ""}
 
     try:
-        # prima prova: range leggero per capire se esiste davvero
-        r = await client.get(url, headers={"Range": "bytes=0-1"}, follow_redirects=False)
-        if r.status_code in (301, 302, 303, 307, 308):
-            # con cookie giusti non dovrebbe succedere; logghiamo
-            return {"id": str(n), "file": fname, "status": "REDIRECT", "http": str(r.status_code)}
-
-        if r.status_code == 404:
-            return {"id": str(n), "file": fname, "status": "NOT_FOUND", "http": "404"}
-
-        if r.status_code not in (200, 206) or not is_pdf(r):
-            return {"id": str(n), "file": fname, "status": "NOT_PDF", "http": str(r.status_code)}
-
-        # scarica completo
-        r2 = await client.get(url, follow_redirects=True)
-        if r2.status_code == 200 and is_pdf(r2):
-            target.write_bytes(r2.content)
-            return {"id": str(n), "file": fname, "status": "DOWNLOADED", "http": "200"}
-        else:
-            return {"id": str(n), "file": fname, "status": "DOWNLOAD_FAIL", "http": str(r2.status_code)}
+        for attempt in range(MAX_ATTEMPTS):
+            if limiter is not None:
+                await limiter.wait()
+            # una sola GET in streaming: status e header decidono, il body va dritto su .part
+            async with client.stream("GET", url, follow_redirects=False) as r:
+                if r.status_code in RETRY_STATUS and attempt < MAX_ATTEMPTS - 1:
+                    delay = retry_delay(r, attempt)
+                else:
+                    return await save_response(r, n, fname, target)
+            await asyncio.sleep(delay)
 
     except Exception as e:
         return {"id": str(n), "file": fname, "status": "ERROR", "http": repr(e)}
@@ -60,7 +129,7 @@ async def main():
     ap.add_argument("--start", type=int, required=True, help="Start EFTA id (e.g., 1)")
     ap.add_argument("--end", type=int, required=True, help="End EFTA id inclusive (e.g., 500)")
     ap.add_argument("--concurrency", type=int, default=3, help="Parallel downloads (keep low)")
-    ap.add_argument("--delay", type=float, default=0.5, help="Delay between task scheduling (seconds)")
+    ap.add_argument("--rate", type=float, default=2.0, help="Max requests started per second (0 = unlimited)")
     ap.add_argument("--cookies", default="justice_storage.json", help="Playwright storage_state JSON")
     args = ap.parse_args()
 
@@ -70,36 +139,47 @@ async def main():
         "User-Agent": "Mozilla/5.0 (Macintosh; Intel Mac OS X) AppleWebKit/537.36 (KHTML, like Gecko) Chrome Safari",
         "Accept": "*/*",
         "Accept-Language": "en-US,en;q=0.9",
-        "Connection": "keep-alive",
     }
 
-    sem = asyncio.Semaphore(args.concurrency)
-    results = []
-
-    async with httpx.AsyncClient(headers=headers, cookies=cookies, timeout=60.0) as client:
-
-        async def bound_fetch(n: int):
-            async with sem:
-                return await fetch_one(client, n)
-
-        tasks = []
-        for n in range(args.start, args.end + 1):
-            tasks.append(asyncio.create_task(bound_fetch(n)))
-            await asyncio.sleep(args.delay)
+    # coda limitata: gli id vengono prodotti man mano, non tutti in anticipo
+    queue: asyncio.Queue = asyncio.Queue(maxsize=args.concurrency * 4)
+    limiter = RateLimiter(args.rate)
 
-        for t in asyncio.as_completed(tasks):
-            res = await t
-            results.append(res)
-            if res["status"] in ("DOWNLOADED", "NOT_FOUND"):
-                print(res["status"], res["file"])
+    # HTTP/2: tutte le richieste multiplexate su una sola connessione TLS;
+    # pool dimensionato sui worker, connect breve per fallire presto
+    limits = httpx.Limits(max_connections=args.concurrency, max_keepalive_connections=args.concurrency)
+    timeout = httpx.Timeout(60.0, connect=10.0)
 
-    # log CSV
-    with open("download_log.csv", "w", newline="", encoding="utf-8") as f:
-        w = csv.DictWriter(f, fieldnames=["id", "file", "status", "http"])
+    # log CSV scritto riga per riga: un run interrotto lascia un log valido
+    with open(LOG_CSV, "w", newline="", encoding="utf-8") as log_f:
+        w = csv.DictWriter(log_f, fieldnames=["id", "file", "status", "http"])
         w.writeheader()
-        w.writerows(results)
 
-    print("\nSaved log: download_log.csv")
+        async with httpx.AsyncClient(
+            http2=True, limits=limits, headers=headers, cookies=cookies, timeout=timeout
+        ) as client:
+
+            async def producer():
+                for n in range(args.start, args.end + 1):
+                    await queue.put(n)
+                for _ in range(args.concurrency):
+                    await queue.put(None)
+
+            async def worker():
+                while True:
+                    n = await queue.get()
+                    if n is None:
+                        return
+                    res = await fetch_one(client, n, limiter)
+                    # nessun await fra write e flush: niente lock fra i worker
+                    w.writerow(res)
+                    log_f.flush()
+                    if res["status"] in ("DOWNLOADED", "NOT_FOUND"):
+                        print(res["status"], res["file"])
+
+            await asyncio.gather(producer(), *(worker() for _ in range(args.concurrency)))
+
+    print(f"\nSaved log: {LOG_CSV}")
     print("Downloaded files in:", OUTDIR.resolve())
 
 if __name__ == "__main__":
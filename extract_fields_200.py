@@ -1,54 +1,117 @@
+import os
 import re
 import csv
+from multiprocessing import Pool
 from pathlib import Path
 import fitz
 
 PDF_DIR = Path("downloads_dataset1")
 OUT_CSV = Path("fields_200.csv")
+FIELDNAMES = [
+    "file", "date", "case_id", "photographer", "location",
+    "text_source", "text_len", "text_sample",
+]
+HEADER_FRAC = 0.35  # quota di pagina (dall'alto) letta al primo tentativo
 
-date_re = re.compile(r"\bDATE\b[^\w]{0,10}([0-9A-Za-z\-/_. ]{3,20})", re.IGNORECASE)
-case_re = re.compile(r"\bCASE\s*ID\b[^\w]{0,10}([0-9A-Za-z\-/_. ]{3,40})", re.IGNORECASE)
-phot_re = re.compile(r"\bPHOTOGRAPHER\b[^\w]{0,10}([0-9A-Za-z\-/_. ]{2,60})", re.IGNORECASE)
-loc_re  = re.compile(r"\bLOCATION\b[^\w]{0,10}([0-9A-Za-z\-/_. ]{2,60})", re.IGNORECASE)
+# un solo pattern per i quattro campi: lookahead a larghezza zero, così le
+# etichette vengono trovate anche se cadono dentro il valore di un'altra
+FIELDS_RE = re.compile(
+    r"\b(?="
+    r"DATE\b[^\w]{0,10}(?P<date>[0-9A-Za-z\-/_. ]{3,20})"
+    r"|CASE\s*ID\b[^\w]{0,10}(?P<case_id>[0-9A-Za-z\-/_. ]{3,40})"
+    r"|PHOTOGRAPHER\b[^\w]{0,10}(?P<photographer>[0-9A-Za-z\-/_. ]{2,60})"
+    r"|LOCATION\b[^\w]{0,10}(?P<location>[0-9A-Za-z\-/_. ]{2,60})"
+    r")",
+    re.IGNORECASE,
+)
+FIELDS = ("date", "case_id", "photographer", "location")
 
-def first_match(rx, text):
-    m = rx.search(text)
-    return m.group(1).strip() if m else ""
+def match_fields(text):
+    # prima occorrenza di ogni campo, in una sola scansione del testo
+    out = dict.fromkeys(FIELDS)
+    missing = len(FIELDS)
+    for m in FIELDS_RE.finditer(text):
+        k = m.lastgroup
+        if out[k] is None:
+            out[k] = m.group(k).strip()
+            missing -= 1
+            if not missing:
+                break
+    return {k: v or "" for k, v in out.items()}
 
-rows = []
-pdfs = sorted(PDF_DIR.glob("EFTA*.pdf"))
+def list_pdfs(pdf_dir: Path) -> list:
+    # una sola passata con scandir, senza il matching fnmatch di glob
+    with os.scandir(pdf_dir) as it:
+        pdfs = [
+            Path(e.path)
+            for e in it
+            if e.name.startswith("EFTA") and e.name.endswith(".pdf") and e.is_file()
+        ]
+    pdfs.sort()
+    return pdfs
 
-for p in pdfs:
+def page_text(page, clip=None) -> str:
+    txt = page.get_text("text", clip=clip) or ""
+    return " ".join(txt.split())  # normalizza spazi
+
+def extract_fields(p: Path) -> dict:
     doc = fitz.open(p)
     # prendi solo la prima pagina per ora (più veloce)
-    txt = doc[0].get_text("text") or ""
+    page = doc[0]
+    # prima solo la fascia alta, dove stanno le etichette; pagina intera
+    # solo se lì non c'è nessun campo
+    r = page.rect
+    # text_source dice da dove vengono campi e text_len/text_sample:
+    # "header" = solo la fascia alta, "page" = pagina intera
+    source = "header"
+    # la fascia è calcolata sulla pagina come appare (page.rect, già ruotata),
+    # ma clip= vuole coordinate non ruotate: va riportata con derotation_matrix
+    band = fitz.Rect(r.x0, r.y0, r.x1, r.y0 + r.height * HEADER_FRAC) * page.derotation_matrix
+    clean = page_text(page, band)
+    fields = match_fields(clean)
+    if not any(fields.values()):
+        source = "page"
+        clean = page_text(page)
+        fields = match_fields(clean)
     doc.close()
 
-    clean = " ".join(txt.split())  # normalizza spazi
-    rows.append({
+    return {
         "file": p.name,
-        "date": first_match(date_re, clean),
-        "case_id": first_match(case_re, clean),
-        "photographer": first_match(phot_re, clean),
-        "location": first_match(loc_re, clean),
+        **fields,
+        "text_source": source,
         "text_len": len(clean),
         "text_sample": clean[:120],
-    })
-
-with open(OUT_CSV, "w", newline="", encoding="utf-8") as f:
-    w = csv.DictWriter(f, fieldnames=rows[0].keys())
-    w.writeheader()
-    w.writerows(rows)
-
-print("Saved:", OUT_CSV.resolve())
-
-# mini statistiche
-with_date = sum(1 for r in rows if r["date"])
-with_case = sum(1 for r in rows if r["case_id"])
-with_phot = sum(1 for r in rows if r["photographer"])
-with_loc  = sum(1 for r in rows if r["location"])
-print("Rows:", len(rows))
-print("Has DATE:", with_date)
-print("Has CASE ID:", with_case)
-print("Has PHOTOGRAPHER:", with_phot)
-print("Has LOCATION:", with_loc)
+    }
+
+def main():
+    pdfs = list_pdfs(PDF_DIR)
+
+    total = from_header = 0
+    found = dict.fromkeys(FIELDS, 0)
+
+    # CSV scritto riga per riga man mano che i worker finiscono
+    with open(OUT_CSV, "w", newline="", encoding="utf-8") as f, Pool() as pool:
+        w = csv.DictWriter(f, fieldnames=FIELDNAMES)
+        w.writeheader()
+        # un PDF per task, ordine dei risultati preservato
+        for r in pool.imap(extract_fields, pdfs, chunksize=8):
+            w.writerow(r)
+            f.flush()
+
+            total += 1
+            from_header += r["text_source"] == "header"
+            for k in FIELDS:
+                found[k] += bool(r[k])
+
+    print("Saved:", OUT_CSV.resolve())
+
+    # mini statistiche
+    print("Rows:", total)
+    print("From header only:", from_header)
+    print("Has DATE:", found["date"])
+    print("Has CASE ID:", found["case_id"])
+    print("Has PHOTOGRAPHER:", found["photographer"])
+    print("Has LOCATION:", found["location"])
+
+if __name__ == "__main__":
+    main()